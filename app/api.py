@@ -1,59 +1,231 @@
 """
 FastAPI routes for the JobPlanner application.
 """
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, List, Optional, Tuple
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 
-from app.graph_runtime import planner_agent
-from app.tools import parse_job_description, save_job_description
-import time, logging, json, uuid
-from app.logging_setup import setup_logging, RequestIdFilter
+from app import settings, tools
+import asyncio, contextvars, functools, gzip, hashlib, os, threading, time, logging, json
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from app.logging_setup import setup_logging, REQUEST_ID
 
 setup_logging()  
 logger = logging.getLogger("jobplanner.api")
 
-app = FastAPI(title="JobPlanner API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile the graph once per worker process, after any fork and before serving
+    from app.graph_runtime import build_planner_agent
+    app.state.planner = build_planner_agent()
+    # Separate pools so LLM work is capped (provider rate limits) and never starves
+    # short file I/O; neither shares Starlette's default threadpool with sync routes
+    app.state.llm_pool = ThreadPoolExecutor(max_workers=settings.PLAN_CONCURRENCY, thread_name_prefix="llm")
+    app.state.io_pool = ThreadPoolExecutor(max_workers=settings.IO_CONCURRENCY, thread_name_prefix="io")
+    # One slot per concurrent LLM workload; /plan/stream runs its nodes outside llm_pool,
+    # so the pool size alone can't enforce PLAN_CONCURRENCY
+    app.state.llm_slots = asyncio.Semaphore(settings.PLAN_CONCURRENCY)
+    # Index refreshes inside planner tools read job files on the same bounded pool
+    tools.io_executor = app.state.io_pool
+    try:
+        yield
+    finally:
+        tools.io_executor = None
+        app.state.llm_pool.shutdown(wait=True)
+        app.state.io_pool.shutdown(wait=True)
+
+
+app = FastAPI(title="JobPlanner API", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+
+def _invoke_planner(initial_input: dict, nocache: bool = False) -> dict:
+    return app.state.planner.invoke(initial_input, config={"configurable": {"nocache": nocache}})
+
+
+def _parse_job(job_description: str) -> dict:
+    return tools.parse_job_description(job_description)
+
+
+def _save_job(job_data: dict) -> str:
+    filename = tools.save_job_description(job_data)
+    _jobs_changed()
+    return filename
+
+
+def _initial_state(user_input: str) -> dict:
+    """Fresh planner input for a request; the lists must not be shared between runs."""
+    return {"user_input": user_input, "intermediate_messages": [], "messages": []}
+
+
+async def _run_blocking(pool, fn, *args):
+    """Run a blocking call on one of the app's pools and await its result."""
+    loop = asyncio.get_running_loop()
+    # Executor threads don't inherit contextvars; copy them so logs keep the request id
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(pool, ctx.run, fn, *args)
+
+
+async def _run_llm(fn, *args):
+    """Run a blocking LLM call on the LLM pool while holding one of the shared slots."""
+    async with app.state.llm_slots:
+        return await _run_blocking(app.state.llm_pool, fn, *args)
+
+
+# Request bodies are plain strings: ignore unknown fields and strip whitespace during validation
+_INPUT_CONFIG = ConfigDict(extra="ignore", str_strip_whitespace=True)
 
 class PlanIn(BaseModel):
+    model_config = _INPUT_CONFIG
     user_input: str
 
 class SaveJobIn(BaseModel):
+    model_config = _INPUT_CONFIG
     job_description: str
 
+class SaveJobsIn(BaseModel):
+    model_config = _INPUT_CONFIG
+    job_descriptions: List[str]
+
 class PlanWithJobIn(BaseModel):
+    model_config = _INPUT_CONFIG
     job_description: str
     user_input: Optional[str] = None
 
+_HEALTH_ETAG = '"ok"'
+_HEALTH_HEADERS = {"Cache-Control": "no-cache", "ETag": _HEALTH_ETAG}
+_HEALTH_RESPONSE = ORJSONResponse({"ok": True}, headers=_HEALTH_HEADERS)
+
+
 @app.get("/health")
-def health():
-    return {"ok": True}
+def health(request: Request):
+    # no-cache still lets clients revalidate cheaply with If-None-Match
+    if request.headers.get("if-none-match") == _HEALTH_ETAG:
+        return Response(status_code=304, headers=_HEALTH_HEADERS)
+    return _HEALTH_RESPONSE
+
+
+@functools.lru_cache(maxsize=512)
+def _cached_invoke(key: str, jobs_generation: int) -> tuple:
+    """Run the planner on a JSON-encoded input; identical inputs reuse the first result.
+
+    Results include tool output read from the saved jobs, so they are also keyed on
+    the jobs generation and are only reused until the next save.
+    """
+    result = _invoke_planner(json.loads(key))
+    return result.get("final_output"), tuple(result.get("intermediate_messages", []))
+
+
+# Bumped on every job save. Part of the cache and in-flight keys, so a run that was
+# already going when a job was saved can't repopulate the cache with stale listings.
+_jobs_generation = 0
+_jobs_generation_lock = threading.Lock()
+
+
+def _jobs_changed() -> None:
+    global _jobs_generation
+    with _jobs_generation_lock:
+        _jobs_generation += 1
+    _cached_invoke.cache_clear()
+
+
+# Planner runs currently in flight, keyed like _cached_invoke, so that concurrent
+# identical requests share a single LLM run instead of each starting their own
+_inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+
+def _finish_inflight(key: Tuple[str, int], fut: asyncio.Future) -> None:
+    _inflight.pop(key, None)
+    # Mark the error as retrieved: if every waiter was cancelled (clients gone),
+    # nobody else will, and asyncio would log "exception was never retrieved"
+    if not fut.cancelled():
+        fut.exception()
+
+
+async def _coalesced_invoke(key: str) -> tuple:
+    inflight_key = (key, _jobs_generation)
+    # No await between the lookup and the insert, so this is atomic on the event loop
+    fut = _inflight.get(inflight_key)
+    if fut is None:
+        fut = asyncio.ensure_future(_run_llm(_cached_invoke, *inflight_key))
+        _inflight[inflight_key] = fut
+        fut.add_done_callback(functools.partial(_finish_inflight, inflight_key))
+    # Shield so one client disconnecting doesn't cancel the run for the others
+    return await asyncio.shield(fut)
 
 
 @app.post("/plan")
-def plan(payload: PlanIn):
-    initial_input = {
-        "user_input": payload.user_input,
-        "intermediate_messages": [],
-        "messages": []
-    }
-    result = planner_agent.invoke(initial_input)
+async def plan(payload: PlanIn, nocache: bool = False):
+    initial_input = _initial_state(payload.user_input)
+    if nocache:
+        result = await _run_llm(_invoke_planner, initial_input, True)
+        final_output = result.get("final_output")
+        intermediate_messages = result.get("intermediate_messages", [])
+    else:
+        key = json.dumps(initial_input, sort_keys=True)
+        final_output, intermediate_messages = await _coalesced_invoke(key)
     return {
-        "final_output": result.get("final_output"),
-        "intermediate_messages": result.get("intermediate_messages", []),
+        "final_output": final_output,
+        "intermediate_messages": list(intermediate_messages),
     }
 
 
+_GRAPH_NODES = ("planner", "executer", "synthesizer")
+
+
+def _sse(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, default=str) + b"\n\n"
+
+
+@app.post("/plan/stream")
+async def plan_stream(payload: PlanIn):
+    """Run the planner and stream progress as server-sent events.
+
+    Emits `token` events with LLM output chunks as they arrive, a `step` event as each
+    graph node finishes, and a final `done` event carrying final_output. Each token
+    carries the run_id of its LLM call, since batched reasoning steps stream
+    concurrently within one node.
+    """
+    initial_input = _initial_state(payload.user_input)
+
+    async def events():
+        try:
+            async with app.state.llm_slots:
+                async for ev in app.state.planner.astream_events(initial_input, version="v2"):
+                    kind = ev["event"]
+                    if kind == "on_chat_model_stream":
+                        content = ev["data"]["chunk"].content
+                        if content:
+                            yield _sse("token", {
+                                "node": ev["metadata"].get("langgraph_node"),
+                                "run_id": ev["run_id"],
+                                "content": content,
+                            })
+                    elif kind == "on_chain_end":
+                        if not ev["parent_ids"]:
+                            yield _sse("done", {"final_output": ev["data"]["output"].get("final_output")})
+                        elif ev["name"] in _GRAPH_NODES and ev["metadata"].get("langgraph_node") == ev["name"]:
+                            yield _sse("step", {"node": ev["name"], "output": ev["data"].get("output")})
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.exception("Plan stream failed")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @app.post("/save-job")
-def save_job(payload: SaveJobIn):
+async def save_job(payload: SaveJobIn):
     """Parse and save a job description from raw text."""
     try:
         # Parse the job description
-        job_data = parse_job_description(payload.job_description)
+        job_data = await _run_llm(_parse_job, payload.job_description)
         
         # Save to file
-        filename = save_job_description(job_data)
+        filename = await _run_blocking(app.state.io_pool, _save_job, job_data)
         
         return {
             "success": True,
@@ -65,31 +237,64 @@ def save_job(payload: SaveJobIn):
         raise HTTPException(status_code=400, detail=f"Failed to parse or save job description: {str(e)}")
 
 
+@app.post("/save-jobs")
+async def save_jobs(payload: SaveJobsIn):
+    """Parse and save several job descriptions from raw text in one request."""
+    try:
+        # Parse all descriptions at once; each LLM call takes its own planner slot
+        jobs = await tools.parse_job_descriptions(
+            payload.job_descriptions, limiter=app.state.llm_slots
+        )
+        
+        filenames = await asyncio.gather(
+            *(_run_blocking(app.state.io_pool, _save_job, job_data) for job_data in jobs)
+        )
+        
+        return {
+            "success": True,
+            "jobs": [
+                {"filename": filename, "job_data": job_data}
+                for filename, job_data in zip(filenames, jobs)
+            ],
+        }
+    except Exception as e:
+        logger.exception("Failed to save job descriptions")
+        raise HTTPException(status_code=400, detail=f"Failed to parse or save job descriptions: {str(e)}")
+
+
+# Default /plan-with-job prompt. Names both the exact filename (most reliable) and the
+# title/list fallbacks so the planner can always find the saved job.
+_DEFAULT_JOB_PROMPT = (
+    "Create a learning and preparation plan for the {title} position at {company}. "
+    "First, load the job description using get_job_by_filename(\"{filename}\") or "
+    "load_job_by_title(\"{title}\") or list_all_jobs() to find it, then analyze the "
+    "requirements and create a comprehensive plan."
+).format
+
+
 @app.post("/plan-with-job")
-def plan_with_job(payload: PlanWithJobIn):
+async def plan_with_job(payload: PlanWithJobIn):
     """Save a job description and generate a plan using it."""
     try:
-        # Parse and save the job description
-        job_data = parse_job_description(payload.job_description)
-        filename = save_job_description(job_data)
+        # Parse the job description and save it before planning: the default prompt
+        # has the planner read the saved file via get_job_by_filename
+        job_data = await _run_llm(_parse_job, payload.job_description)
+        filename = await _run_blocking(app.state.io_pool, _save_job, job_data)
         
         # Generate user input if not provided
         if payload.user_input:
             user_input = payload.user_input
         else:
             # Default: create a plan for this specific job
-            title = job_data.get('title', 'this position')
-            company = job_data.get('company', 'this company')
-            # Use filename for more reliable loading, or provide both options
-            user_input = f"Create a learning and preparation plan for the {title} position at {company}. First, load the job description using get_job_by_filename(\"{filename}\") or load_job_by_title(\"{title}\") or list_all_jobs() to find it, then analyze the requirements and create a comprehensive plan."
+            user_input = _DEFAULT_JOB_PROMPT(
+                title=job_data.get('title', 'this position'),
+                company=job_data.get('company', 'this company'),
+                filename=filename,
+            )
         
         # Generate the plan
-        initial_input = {
-            "user_input": user_input,
-            "intermediate_messages": [],
-            "messages": []
-        }
-        result = planner_agent.invoke(initial_input)
+        initial_input = _initial_state(user_input)
+        result = await _run_llm(_invoke_planner, initial_input)
         
         return {
             "success": True,
@@ -103,9 +308,34 @@ def plan_with_job(payload: PlanWithJobIn):
         raise HTTPException(status_code=400, detail=f"Failed to process: {str(e)}")
 
 
-@app.get("/", response_class=HTMLResponse)
-def root():
-    return """
+@app.get("/jobs")
+async def list_jobs():
+    """List all saved jobs."""
+    entries = await tools.aload_all_jobs(app.state.io_pool)
+    return {
+        "jobs": [
+            {"id": stem, "title": entry.data.get("title"), "company": entry.data.get("company")}
+            for stem, entry in entries
+        ]
+    }
+
+
+def _read_job(job_id: str):
+    # Stat just this file rather than refreshing the whole index; the stat keys the parse cache
+    job_file = tools.JOBS_DIR / f"{job_id}.json"
+    return tools._load_json_cached(str(job_file), job_file.stat().st_mtime_ns)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get a saved job by its filename (without .json)."""
+    try:
+        return await _run_blocking(app.state.io_pool, _read_job, job_id)
+    except (FileNotFoundError, orjson.JSONDecodeError, IOError):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+
+
+_ROOT_HTML = """
 <!doctype html>
 <html lang="en">
 <meta charset="utf-8">
@@ -307,25 +537,89 @@ btn.addEventListener('click', async () => {
 </html>
 """
 
+# The demo page is static: encode, compress and build its responses once at import
+_ROOT_BYTES = _ROOT_HTML.encode("utf-8")
+_ROOT_GZIP = gzip.compress(_ROOT_BYTES, compresslevel=9)
+_ROOT_ETAG = '"%s"' % hashlib.md5(_ROOT_BYTES, usedforsecurity=False).hexdigest()
+_ROOT_GZIP_ETAG = _ROOT_ETAG[:-1] + '-gzip"'
+_ROOT_HEADERS = {"Cache-Control": "public, max-age=300", "Vary": "Accept-Encoding"}
+_ROOT_RESPONSE = Response(
+    content=_ROOT_BYTES,
+    media_type="text/html; charset=utf-8",
+    headers={**_ROOT_HEADERS, "ETag": _ROOT_ETAG},
+)
+_ROOT_GZIP_RESPONSE = Response(
+    content=_ROOT_GZIP,
+    media_type="text/html; charset=utf-8",
+    headers={**_ROOT_HEADERS, "ETag": _ROOT_GZIP_ETAG, "Content-Encoding": "gzip"},
+)
 
-@app.middleware("http")
-async def timing_and_requestid(request: Request, call_next):
-    start = time.time()
-    request_id = request.headers.get("x-request-id", str(uuid.uuid4()))
-    # attach request_id to all logs on this request
-    req_logger = logging.LoggerAdapter(logger, {"request_id": request_id})
-    try:
-        resp = await call_next(request)
-        resp.headers["X-Elapsed-ms"] = str(int((time.time() - start) * 1000))
-        resp.headers["X-Request-Id"] = request_id
-        req_logger.info("request complete", extra={
-            "path": request.url.path,
-            "method": request.method,
-            "status_code": resp.status_code,
-        })
-        return resp
-    except Exception as e:
-        req_logger.exception("request error", extra={
-            "path": request.url.path, "method": request.method
-        })
-        raise
+
+@app.get("/", response_class=HTMLResponse)
+def root(request: Request):
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        etag, response = _ROOT_GZIP_ETAG, _ROOT_GZIP_RESPONSE
+    else:
+        etag, response = _ROOT_ETAG, _ROOT_RESPONSE
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={**_ROOT_HEADERS, "ETag": etag})
+    return response
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware adding X-Elapsed-ms / X-Request-Id headers and a request log line.
+
+    Avoids BaseHTTPMiddleware, which wraps every request in an extra task and response stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter_ns()
+        request_id = next(
+            (v.decode("latin-1") for k, v in scope["headers"] if k == b"x-request-id"),
+            None,
+        ) or os.urandom(16).hex()
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Copy rather than append in place: cached Response objects share their header list
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-elapsed-ms", str((time.perf_counter_ns() - start) // 1_000_000).encode()),
+                    (b"x-request-id", request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        # attach request_id to all logs on this request, including ones from executor threads
+        token = REQUEST_ID.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+            logger.info("request complete", extra={
+                "path": scope["path"],
+                "method": scope["method"],
+                "status_code": status_code,
+            })
+        except Exception as e:
+            # Tracebacks are costly to format when errors come in bursts; only include them at DEBUG
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.exception("request error", extra={
+                    "path": scope["path"], "method": scope["method"]
+                })
+            else:
+                logger.error("request error: %s", type(e).__name__, extra={
+                    "path": scope["path"], "method": scope["method"]
+                })
+            raise
+        finally:
+            REQUEST_ID.reset(token)
+
+
+app.add_middleware(TimingMiddleware)
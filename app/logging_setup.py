@@ -1,27 +1,76 @@
 # app/logging_setup.py
-import logging, sys, uuid
-from pythonjsonlogger import jsonlogger
+import atexit, logging, queue, sys, uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+
+_listener = None
+
+# Request id of the request being served in the current context; set by the API middleware
+REQUEST_ID: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord carries; anything else on a record was passed via extra=
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class OrjsonFormatter(logging.Formatter):
+    """Render each record as one JSON line using orjson.
+
+    Emits asctime, levelname, name, message and request_id, followed by any
+    extra= fields and the formatted exc_info when present.
+    """
+
+    def format(self, record):
+        payload = {
+            "asctime": self.formatTime(record),
+            "levelname": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+class _LocalQueueHandler(QueueHandler):
+    """QueueHandler for an in-process queue.
+
+    The stock prepare() formats the record in the caller's thread so it can be
+    pickled; records never leave this process, so leave all formatting to the listener.
+    """
+
+    def prepare(self, record):
+        return record
 
 def setup_logging(level="INFO"):
-    handler = logging.StreamHandler(sys.stdout)
-    fmt = jsonlogger.JsonFormatter(
-        "%(asctime)s %(levelname)s %(name)s %(message)s %(request_id)s"
-    )
-    handler.setFormatter(fmt)
+    global _listener
     root = logging.getLogger()
     root.setLevel(level)
+    if _listener is not None:
+        # Already configured (e.g. api re-imported under --reload); don't start a second listener
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(OrjsonFormatter())
     # Remove uvicorn's default handlers to avoid duplicate logs
     for h in list(root.handlers):
         root.removeHandler(h)
-    root.addHandler(handler)
+    # Callers only enqueue records; JSON formatting and the stdout write run on the listener thread
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LocalQueueHandler(log_queue)
+    # Filters run in the caller's context, which is where REQUEST_ID is set
+    queue_handler.addFilter(RequestIdFilter())
+    root.addHandler(queue_handler)
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
 
 class RequestIdFilter(logging.Filter):
-    def __init__(self, request_id=None):
-        super().__init__()
-        self.request_id = request_id or "-"
-
     def filter(self, record):
         # add request_id attribute if missing
         if not hasattr(record, "request_id"):
-            record.request_id = self.request_id
+            record.request_id = REQUEST_ID.get()
         return True
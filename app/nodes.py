@@ -2,20 +2,23 @@
 Graph nodes for the job planning workflow.
 """
 import os
-from typing import List, Optional, Annotated, TypedDict
+from app import settings  # noqa: F401  (loads .env)
+from typing import Any, Dict, List, Optional, Annotated, Tuple, TypedDict
 from pydantic import BaseModel, Field
 from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph.message import add_messages
 from langchain_tavily import TavilySearch
-from langchain_nebius import ChatNebius
 from langchain.tools import tool
-from app.tools import (load_job_by_title, search_jobs_by_title, list_all_jobs,
+from app.tools import (get_llm, load_job_by_title, search_jobs_by_title, list_all_jobs,
                        get_job_by_filename, search_jobs_by_criteria)
-from dotenv import load_dotenv
-load_dotenv(override=True)
 
 import logging
+import operator
 import re
+import threading
+import unicodedata
+from collections import OrderedDict
 
 # Set up logging with separate loggers for each node
 logger = logging.getLogger("jobplanner.nodes")
@@ -24,6 +27,9 @@ executor_logger = logging.getLogger("jobplanner.nodes.executor")
 synthesizer_logger = logging.getLogger("jobplanner.nodes.synthesizer")
 router_logger = logging.getLogger("jobplanner.nodes.router")
 
+_THINK_BLOCK_RE = re.compile(r"(?is)<think>[\s\S]*?</think>")
+_REASONING_HEADER_RE = re.compile(r"(?is)^(thoughts?|reasoning|analysis)\s*:\s*[\s\S]*?(?=\n\s*\n|\Z)")
+
 def sanitize_model_output(text: Optional[str]) -> str:
     """Remove chain-of-thought or thinking sections from model output.
 
@@ -31,9 +37,9 @@ def sanitize_model_output(text: Optional[str]) -> str:
     """
     if not text:
         return ""
-    cleaned = re.sub(r"(?is)<think>[\s\S]*?</think>", "", text)
+    cleaned = _THINK_BLOCK_RE.sub("", text)
     # Remove leading sections labeled as Thought/Reasoning/etc. up to a blank line
-    cleaned = re.sub(r"(?is)^(thoughts?|reasoning|analysis)\s*:\s*[\s\S]*?(?=\n\s*\n|\Z)", "", cleaned).strip()
+    cleaned = _REASONING_HEADER_RE.sub("", cleaned).strip()
     return cleaned
 
 
@@ -49,16 +55,7 @@ def web_search_tool(query: str) -> str:
     return str(response)
 
 
-llm = ChatNebius(model="Qwen/Qwen3-14B", api_key=os.environ["NEBIUS_API_KEY"])
-# Add job tools to your tool list
-llm_with_tools = llm.bind_tools([
-    web_search_tool, 
-    load_job_by_title, 
-    search_jobs_by_title,
-    list_all_jobs,
-    get_job_by_filename,
-    search_jobs_by_criteria
-])
+llm = get_llm()
 
 class Plan(BaseModel):
     """
@@ -79,19 +76,39 @@ class WeeklyPlan(BaseModel):
     summary: Optional[str] = Field(default=None, description="High-level summary of the plan")
     days: List[DayPlan] = Field(description="Ordered list of daily plans")
 
+# Structured-output bindings build a JSON schema and output parser; do it once, not per call
+planner_llm = llm.with_structured_output(Plan)
+synthesizer_llm = llm.with_structured_output(WeeklyPlan)
+
 class PlannerState(TypedDict):
     """
     The state of the planner agent
     """
     user_input: str
     plan: Optional[List[str]] = None
-    intermediate_messages: Optional[List[str]] = None
+    # Nodes return only new messages; LangGraph appends them to the existing list
+    intermediate_messages: Annotated[List[str], operator.add]
     messages: Annotated[List[BaseMessage], add_messages]
     final_output: Optional[str] = None
 
-def planner_node(state: PlannerState) -> PlannerState:
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Plans for recently seen tasks, keyed by _normalize_task(). Near-identical requests
+# (case, spacing, unicode variants) skip the planner LLM call; least recently used go first.
+_PLAN_CACHE_SIZE = 512
+_plan_cache: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+def _normalize_task(text: str) -> str:
+    """Canonical form of a task for plan caching."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+def planner_node(state: PlannerState, config: Optional[RunnableConfig] = None) -> PlannerState:
     """
-    Plan the steps for the task
+    Plan the steps for the task.
+    
+    Pass config={"configurable": {"nocache": True}} to skip the plan cache lookup
+    (a fresh plan still refreshes the cache).
     """
     user_input = state.get("user_input", "")
     planner_logger.info(
@@ -116,6 +133,24 @@ def planner_node(state: PlannerState) -> PlannerState:
             "When you have enough information to plan, output ONLY JSON: {\"steps\": [\"...\"]} with 4–7 concrete steps."
         )
         msgs = state.get("messages") or []
+        # Only fresh tasks are cacheable; a seeded conversation carries its own context
+        cache_key = None if msgs else _normalize_task(user_input)
+        nocache = ((config or {}).get("configurable") or {}).get("nocache")
+        if cache_key is not None and not nocache:
+            with _plan_cache_lock:
+                cached = _plan_cache.get(cache_key)
+                if cached is not None:
+                    _plan_cache.move_to_end(cache_key)
+            if cached is not None:
+                planner_logger.info(
+                    "Planner reused cached plan",
+                    extra={
+                        "node": "planner",
+                        "action": "cache_hit",
+                        "plan_step_count": len(cached),
+                    }
+                )
+                return {"plan": list(cached)}
         if not msgs:
             # seed the conversation for the planner
             msgs = [
@@ -123,21 +158,26 @@ def planner_node(state: PlannerState) -> PlannerState:
                     content=f"{PLANNER_SYSTEM}\n\nTask: {user_input}"
                 )
             ]
+            if planner_logger.isEnabledFor(logging.DEBUG):
+                planner_logger.debug(
+                    "Seeded conversation for planner",
+                    extra={"message_count": len(msgs)}
+                )
+
+        # Let the planner take a turn. If it needs the tool it will emit tool_calls.
+        if planner_logger.isEnabledFor(logging.DEBUG):
             planner_logger.debug(
-                "Seeded conversation for planner",
+                "Invoking planner LLM",
                 extra={"message_count": len(msgs)}
             )
-
-        # Let the planner take a turn. If it needs the tool it will emit tool_calls.
-        planner_llm = llm.with_structured_output(Plan)
-        
-        planner_logger.debug(
-            "Invoking planner LLM",
-            extra={"message_count": len(msgs)}
-        )
         ai = planner_llm.invoke(msgs)
         
         plan_steps = ai.steps
+        if cache_key is not None:
+            with _plan_cache_lock:
+                _plan_cache[cache_key] = tuple(plan_steps)
+                if len(_plan_cache) > _PLAN_CACHE_SIZE:
+                    _plan_cache.popitem(last=False)
         planner_logger.info(
             "Planner generated plan successfully",
             extra={
@@ -162,8 +202,130 @@ def planner_node(state: PlannerState) -> PlannerState:
         )
         raise
 
+# Plan steps that call one of these tools don't depend on each other's results
+_STEP_TOOLS = {
+    "web_search_tool": web_search_tool,
+    "load_job_by_title": load_job_by_title,
+    "search_jobs_by_title": search_jobs_by_title,
+    "list_all_jobs": list_all_jobs,
+    "get_job_by_filename": get_job_by_filename,
+    "search_jobs_by_criteria": search_jobs_by_criteria,
+}
+# Tools that take no argument, e.g. list_all_jobs()
+_NO_ARG_TOOLS = {"list_all_jobs"}
+# Leading `name=` of a keyword-style call, e.g. search_jobs_by_criteria(criteria="python")
+_KWARG_RE = re.compile(r"[A-Za-z_]\w*\s*=\s*")
+# Max concurrent calls within one batched group of steps. This is per planner run,
+# on top of the PLAN_CONCURRENCY runs the API allows at once.
+_MAX_STEP_CONCURRENCY = 5
+
+def _parse_step(step: str) -> Optional[Tuple[str, str]]:
+    """Split a `tool_name("arg")` plan step into (tool_name, arg) in a single pass.
+
+    Returns None if the step is not a call to a known tool, i.e. a general reasoning
+    step. A quoted argument ends at its closing quote, so prose after the call is
+    ignored; an unquoted one needs the step to end with `)`. An optional `name=`
+    keyword is dropped, and no-argument tools may be given by bare name. The argument
+    is "" when it can't be extracted.
+    """
+    step = step.strip()
+    i = step.find("(")
+    name = (step if i < 0 else step[:i]).strip()
+    if name not in _STEP_TOOLS:
+        return None
+    if i < 0:
+        return (name, "") if name in _NO_ARG_TOOLS else None
+    rest = step[i + 1:].lstrip()
+    kwarg = _KWARG_RE.match(rest)
+    if kwarg:
+        rest = rest[kwarg.end():]
+    if rest[:1] in ("'", '"'):
+        end = rest.find(rest[0], 1)
+        return name, rest[1:end] if end > 0 else ""
+    if not step.endswith(")"):
+        return name, ""
+    return name, rest[:-1].strip()
+
+def _split_independent_prefix(plan: List[str]) -> int:
+    """Number of leading plan steps of the same kind (tool call or reasoning) as the first.
+
+    Steps never depend on each other's output, so such a run can be executed as one batch.
+    """
+    is_tool = _parse_step(plan[0]) is not None
+    k = 1
+    while k < len(plan) and (_parse_step(plan[k]) is not None) == is_tool:
+        k += 1
+    return k
+
+def _reasoning_prompt(step: str) -> str:
+    return f"""
+            You are a recruitment and job analysis expert. Process this step:
+            
+            Step: {step}
+            
+            Provide expert analysis and recommendations. If this involves job analysis, 
+            consider using the available job tools to get specific information.
+            """
+
+def _run_tool_steps(steps: List[str]) -> List[str]:
+    """Run tool-call steps grouped by tool; web searches go out as one concurrent batch."""
+    responses: List[Optional[str]] = [None] * len(steps)
+    groups: Dict[str, List[Tuple[int, Any]]] = {}
+    for i, step in enumerate(steps):
+        tool_name, arg = _parse_step(step)
+        if tool_name in _NO_ARG_TOOLS:
+            groups.setdefault(tool_name, []).append((i, None))
+        elif arg:
+            groups.setdefault(tool_name, []).append((i, arg))
+        else:
+            responses[i] = f"Error: Could not parse argument for {tool_name}"
+            executor_logger.warning(
+                "Failed to parse tool argument",
+                extra={"tool": tool_name, "step": step}
+            )
+
+    for tool_name, calls in groups.items():
+        if executor_logger.isEnabledFor(logging.DEBUG):
+            executor_logger.debug(
+                "Calling tool",
+                extra={"tool": tool_name, "arguments": [arg for _, arg in calls]}
+            )
+        # Call the underlying functions directly: the arguments are already parsed
+        # strings, so the @tool wrappers' validation and callbacks are pure overhead
+        if tool_name == "web_search_tool":
+            results = web_search.batch(
+                [arg for _, arg in calls],
+                config={"max_concurrency": _MAX_STEP_CONCURRENCY},
+            )
+            outputs = [str(result) for result in results]
+        elif tool_name in _NO_ARG_TOOLS:
+            outputs = [_STEP_TOOLS[tool_name].func() for _ in calls]
+        else:
+            func = _STEP_TOOLS[tool_name].func
+            outputs = [func(arg) for _, arg in calls]
+        for (i, _), output in zip(calls, outputs):
+            responses[i] = output
+    return responses
+
+def _run_reasoning_steps(steps: List[str]) -> List[str]:
+    """Run general reasoning steps with job context as one batched LLM call."""
+    if executor_logger.isEnabledFor(logging.DEBUG):
+        executor_logger.debug(
+            "Using LLM for general reasoning",
+            extra={"steps": steps}
+        )
+    results = llm.batch(
+        [_reasoning_prompt(step) for step in steps],
+        config={"max_concurrency": _MAX_STEP_CONCURRENCY},
+    )
+    return [result.content for result in results]
+
 def job_aware_executor_node(state: PlannerState) -> PlannerState:
-    """Executor that handles both general and job-specific steps."""
+    """Executor that handles both general and job-specific steps.
+
+    The leading run of tool-call steps, or of reasoning steps, is drained and executed
+    as a batch.
+    """
     plan = state.get("plan") or []
     remaining_steps = len(plan)
     
@@ -183,150 +345,25 @@ def job_aware_executor_node(state: PlannerState) -> PlannerState:
         )
         return {"plan": []}
 
-    next_step = plan[0]
-    executor_logger.debug(
-        "Executing next step",
-        extra={
-            "node": "executor",
-            "step": next_step,
-            "step_index": len(state.get("plan", [])) - remaining_steps,
-        }
-    )
-    
-    try:
-        # Route to appropriate handler
-        if next_step.startswith("web_search_tool"):
-            # Web search logic
-            m = re.search(r'web_search_tool\("(.+?)"\)', next_step)
-            if not m:
-                m = re.search(r"web_search_tool\('(.+?)'\)", next_step)
-            if m:
-                query = m.group(1)
-                executor_logger.debug(
-                    "Executing web search",
-                    extra={"tool": "web_search_tool", "query": query}
-                )
-                response = web_search_tool.invoke(query)
-            else:
-                response = "Error: Could not parse web search query"
-                executor_logger.warning(
-                    "Failed to parse web search query",
-                    extra={"step": next_step}
-                )
-                
-        elif next_step.startswith("load_job_by_title"):
-            # Load job by title
-            m = re.search(r'load_job_by_title\("(.+?)"\)', next_step)
-            if m:
-                job_title = m.group(1)
-                executor_logger.debug(
-                    "Loading job by title",
-                    extra={"tool": "load_job_by_title", "job_title": job_title}
-                )
-                response = load_job_by_title.invoke(job_title)
-            else:
-                response = "Error: Could not parse job title"
-                executor_logger.warning(
-                    "Failed to parse job title",
-                    extra={"step": next_step}
-                )
-                
-        elif next_step.startswith("search_jobs_by_title"):
-            # Search jobs by title
-            m = re.search(r'search_jobs_by_title\("(.+?)"\)', next_step)
-            if m:
-                search_term = m.group(1)
-                executor_logger.debug(
-                    "Searching jobs by title",
-                    extra={"tool": "search_jobs_by_title", "search_term": search_term}
-                )
-                response = search_jobs_by_title.invoke(search_term)
-            else:
-                response = "Error: Could not parse search term"
-                executor_logger.warning(
-                    "Failed to parse search term",
-                    extra={"step": next_step}
-                )
-                
-        elif next_step.startswith("list_all_jobs"):
-            # List all jobs
-            executor_logger.debug("Listing all jobs", extra={"tool": "list_all_jobs"})
-            response = list_all_jobs.invoke({})
-            
-        elif next_step.startswith("get_job_by_filename"):
-            # Get job by filename
-            m = re.search(r'get_job_by_filename\("(.+?)"\)', next_step)
-            if m:
-                filename = m.group(1)
-                executor_logger.debug(
-                    "Getting job by filename",
-                    extra={"tool": "get_job_by_filename", "filename": filename}
-                )
-                response = get_job_by_filename.invoke(filename)
-            else:
-                response = "Error: Could not parse filename"
-                executor_logger.warning(
-                    "Failed to parse filename",
-                    extra={"step": next_step}
-                )
-                
-        elif next_step.startswith("search_jobs_by_criteria"):
-            # Search jobs by criteria
-            m = re.search(r'search_jobs_by_criteria\("(.+?)"\)', next_step)
-            if m:
-                criteria = m.group(1)
-                executor_logger.debug(
-                    "Searching jobs by criteria",
-                    extra={"tool": "search_jobs_by_criteria", "criteria": criteria}
-                )
-                response = search_jobs_by_criteria.invoke(criteria)
-            else:
-                response = "Error: Could not parse search criteria"
-                executor_logger.warning(
-                    "Failed to parse search criteria",
-                    extra={"step": next_step}
-                )
-                
-        else:
-            # General reasoning with job context
-            executor_logger.debug(
-                "Using LLM for general reasoning",
-                extra={"step": next_step}
-            )
-            job_prompt = f"""
-            You are a recruitment and job analysis expert. Process this step:
-            
-            Step: {next_step}
-            
-            Provide expert analysis and recommendations. If this involves job analysis, 
-            consider using the available job tools to get specific information.
-            """
-            response = llm.invoke(job_prompt).content
-
-        response_preview = str(response)[:100] if response else ""
-        executor_logger.info(
-            "Step execution completed",
-            extra={
-                "node": "executor",
-                "action": "complete",
-                "step": next_step,
-                "response_length": len(str(response)) if response else 0,
-                "response_preview": response_preview,
-                "remaining_steps": remaining_steps - 1,
-            }
+    batch = plan[:_split_independent_prefix(plan)]
+    if executor_logger.isEnabledFor(logging.DEBUG):
+        executor_logger.debug(
+            "Executing steps",
+            extra={"node": "executor", "steps": batch}
         )
 
-        return {
-            "plan": state["plan"][1:],
-            "intermediate_messages": (state.get("intermediate_messages") or []) + [response]
-        }
+    try:
+        if _parse_step(batch[0]) is not None:
+            responses = _run_tool_steps(batch)
+        else:
+            responses = _run_reasoning_steps(batch)
     except Exception as e:
         executor_logger.error(
             "Step execution failed",
             extra={
                 "node": "executor",
                 "action": "error",
-                "step": next_step,
+                "steps": batch,
                 "error_type": type(e).__name__,
                 "error_message": str(e),
             },
@@ -334,13 +371,32 @@ def job_aware_executor_node(state: PlannerState) -> PlannerState:
         )
         raise
 
+    if executor_logger.isEnabledFor(logging.INFO):
+        for step, response in zip(batch, responses):
+            executor_logger.info(
+                "Step execution completed",
+                extra={
+                    "node": "executor",
+                    "action": "complete",
+                    "step": step,
+                    "response_length": len(str(response)) if response else 0,
+                    "response_preview": str(response)[:100] if response else "",
+                }
+            )
+
+    return {
+        "plan": plan[len(batch):],
+        "intermediate_messages": responses
+    }
+
 def synthesizer_node(state: PlannerState) -> PlannerState:
     """Synthesizes the intermediate messages into a final output.
 
     Uses structured output (WeeklyPlan) to avoid surfacing chain-of-thought.
     """
     intermediate_messages = state.get("intermediate_messages") or []
-    context_length = len("\n".join(intermediate_messages))
+    context = "\n".join(intermediate_messages)
+    context_length = len(context)
     
     synthesizer_logger.info(
         "Synthesizer node started",
@@ -353,16 +409,16 @@ def synthesizer_node(state: PlannerState) -> PlannerState:
     )
     
     try:
-        context = "\n".join(intermediate_messages)
         user_input = state.get("user_input", "")
         
-        synthesizer_logger.debug(
-            "Building synthesis prompt",
-            extra={
-                "user_input_length": len(user_input),
-                "context_length": len(context),
-            }
-        )
+        if synthesizer_logger.isEnabledFor(logging.DEBUG):
+            synthesizer_logger.debug(
+                "Building synthesis prompt",
+                extra={
+                    "user_input_length": len(user_input),
+                    "context_length": context_length,
+                }
+            )
 
         prompt = f"""You are an expert synthesizer. Create a concise, actionable multi-day plan.
 
@@ -374,22 +430,22 @@ Collected Data:
 """
         
         # Ask the model for structured output
-        structured_llm = llm.with_structured_output(WeeklyPlan)
-        weekly_plan: WeeklyPlan = structured_llm.invoke(prompt)
+        weekly_plan: WeeklyPlan = synthesizer_llm.invoke(prompt)
         
         # Log structured content at debug for observability
-        try:
-            import json as _json
-            synthesizer_logger.debug(
-                "Structured plan generated",
-                extra={
-                    "days_count": len(weekly_plan.days or []),
-                    "summary_preview": (weekly_plan.summary or "")[:200],
-                    "json_preview": _json.dumps(weekly_plan.model_dump(), ensure_ascii=False)[:2000],
-                }
-            )
-        except Exception:
-            pass
+        if synthesizer_logger.isEnabledFor(logging.DEBUG):
+            try:
+                import json as _json
+                synthesizer_logger.debug(
+                    "Structured plan generated",
+                    extra={
+                        "days_count": len(weekly_plan.days or []),
+                        "summary_preview": (weekly_plan.summary or "")[:200],
+                        "json_preview": _json.dumps(weekly_plan.model_dump(), ensure_ascii=False)[:2000],
+                    }
+                )
+            except Exception:
+                pass
 
         # Render a pleasant markdown for final_output
         lines: List[str] = []
@@ -441,12 +497,6 @@ Collected Data:
         raise
 
 
-def router_after_planner(state: PlannerState) -> str:
-    msgs = state.get("messages") or []
-    last = msgs[-1] if msgs else None
-    # If the last AI turn requested any tools, go to ToolNode; else, parse the plan.
-    return "tools" if getattr(last, "tool_calls", None) else "executer"
-
 def router_function(state: PlannerState) -> str:
     if state.get("plan"):
         return "executer"
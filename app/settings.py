@@ -6,3 +6,9 @@ REQUIRED = ["NEBIUS_API_KEY", "TAVILY_API_KEY"]
 for k in REQUIRED:
     if not os.environ.get(k):
         raise RuntimeError(f"Missing env var: {k}")
+
+# Max number of planner runs and job parses executing at once. Each planner run can
+# itself fan out to nodes._MAX_STEP_CONCURRENCY (5) provider calls for batched steps.
+PLAN_CONCURRENCY = int(os.environ.get("PLAN_CONCURRENCY", "4"))
+# Worker threads for job file reads and writes
+IO_CONCURRENCY = int(os.environ.get("IO_CONCURRENCY", "32"))
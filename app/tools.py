@@ -4,25 +4,43 @@ Tool functions for job search and data access.
 
 from langchain.tools import tool
 from pathlib import Path
-import json
+import aiofiles
+import asyncio
+import functools
+import httpx
+import orjson
 import os
 import re
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import Executor
+from typing import Optional, Callable, Dict, Any, List, NamedTuple, Tuple
 from pydantic import BaseModel, Field
 from langchain_nebius import ChatNebius
-from dotenv import load_dotenv
+from app import settings  # also loads .env before the clients below read it
 
-load_dotenv(override=True)
+try:
+    import ahocorasick
+except ImportError:  # optional; criteria search falls back to per-keyword substring tests
+    ahocorasick = None
 
 JOBS_DIR = Path("data/jobs")
 JOBS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Initialize LLM for parsing job descriptions
 _llm = None
+# Keep-alive connection pool shared by every Nebius call in the process
+_http_client = httpx.Client(
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+)
+
 def get_llm():
     global _llm
     if _llm is None:
-        _llm = ChatNebius(model="Qwen/Qwen3-14B", api_key=os.environ.get("NEBIUS_API_KEY"))
+        _llm = ChatNebius(
+            model="Qwen/Qwen3-14B",
+            api_key=os.environ.get("NEBIUS_API_KEY"),
+            http_client=_http_client,
+        )
     return _llm
 
 class JobDescription(BaseModel):
@@ -39,17 +57,44 @@ class JobDescription(BaseModel):
     responsibilities: list[str] = Field(default_factory=list, description="List of responsibilities")
 
 
+_SANITIZE_INVALID_RE = re.compile(r'[^\w\s-]')
+_SANITIZE_SEPARATOR_RE = re.compile(r'[-\s]+')
+_TITLE_PUNCT_RE = re.compile(r'[^\w\s]')
+
+
+@functools.lru_cache(maxsize=4096)
 def sanitize_filename(text: str) -> str:
     """Convert text to a valid filename by removing/replacing invalid characters."""
     # Replace spaces and invalid characters with underscores
-    filename = re.sub(r'[^\w\s-]', '', text)
-    filename = re.sub(r'[-\s]+', '_', filename)
+    filename = _SANITIZE_INVALID_RE.sub('', text)
+    filename = _SANITIZE_SEPARATOR_RE.sub('_', filename)
     # Remove leading/trailing underscores
     filename = filename.strip('_')
     # Limit length
     return filename[:100] if len(filename) > 100 else filename
 
 
+_structured_llm = None
+
+def _get_structured_llm():
+    """The shared LLM bound to the JobDescription schema, built on first use."""
+    global _structured_llm
+    if _structured_llm is None:
+        _structured_llm = get_llm().with_structured_output(JobDescription)
+    return _structured_llm
+
+
+def _build_prompt(raw_text: str) -> str:
+    return f"""Extract structured information from the following job description.
+If a field is not mentioned or unclear, use None for optional fields or empty list for list fields.
+
+Job Description:
+{raw_text}
+
+Extract the job title, company name, description, requirements, location, salary, employment type, posted date, benefits, and responsibilities.
+"""
+
+
 def parse_job_description(raw_text: str) -> Dict[str, Any]:
     """
     Parse raw job description text into structured format using LLM.
@@ -60,17 +105,8 @@ def parse_job_description(raw_text: str) -> Dict[str, Any]:
     Returns:
         Dictionary containing structured job data
     """
-    llm = get_llm()
-    structured_llm = llm.with_structured_output(JobDescription)
-    
-    prompt = f"""Extract structured information from the following job description.
-If a field is not mentioned or unclear, use None for optional fields or empty list for list fields.
-
-Job Description:
-{raw_text}
-
-Extract the job title, company name, description, requirements, location, salary, employment type, posted date, benefits, and responsibilities.
-"""
+    structured_llm = _get_structured_llm()
+    prompt = _build_prompt(raw_text)
     
     try:
         job_data = structured_llm.invoke(prompt)
@@ -80,6 +116,41 @@ Extract the job title, company name, description, requirements, location, salary
         raise ValueError(f"Failed to parse job description: {str(e)}")
 
 
+async def parse_job_descriptions(
+    raw_texts: List[str], limiter: Optional[asyncio.Semaphore] = None
+) -> List[Dict[str, Any]]:
+    """
+    Parse several raw job descriptions concurrently using LLM.
+    
+    Args:
+        raw_texts: Raw job description texts pasted by user
+        limiter: Semaphore each LLM call holds while it runs. Defaults to a fresh one
+            allowing PLAN_CONCURRENCY calls at once.
+        
+    Returns:
+        Structured job data for each text, in the same order
+    """
+    structured_llm = _get_structured_llm()
+    if limiter is None:
+        limiter = asyncio.Semaphore(settings.PLAN_CONCURRENCY)
+    
+    async def parse_one(raw_text: str) -> Dict[str, Any]:
+        prompt = _build_prompt(raw_text)
+        async with limiter:
+            try:
+                return (await structured_llm.ainvoke(prompt)).model_dump()
+            except Exception:
+                pass
+        # Retry a failed item on its own before giving up on the batch
+        async with limiter:
+            try:
+                return (await structured_llm.ainvoke(prompt)).model_dump()
+            except Exception as e:
+                raise ValueError(f"Failed to parse job description: {str(e)}")
+    
+    return list(await asyncio.gather(*(parse_one(raw_text) for raw_text in raw_texts)))
+
+
 def save_job_description(job_data: Dict[str, Any], filename: Optional[str] = None) -> str:
     """
     Save job description to data/jobs/ directory.
@@ -99,136 +170,316 @@ def save_job_description(job_data: Dict[str, Any], filename: Optional[str] = Non
     # Ensure filename doesn't have .json extension
     filename = filename.replace('.json', '')
     
+    # orjson writes UTF-8 directly (no ASCII escaping); serialize before claiming a name
+    content = orjson.dumps(job_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    
     filepath = JOBS_DIR / f"{filename}.json"
     
-    # Handle duplicate files by appending a number
+    # Handle duplicate files by appending a number. O_EXCL creates the file only if it
+    # doesn't exist, so concurrent saves can never claim the same name.
     counter = 1
-    original_filepath = filepath
-    while filepath.exists():
-        filepath = JOBS_DIR / f"{filename}_{counter}.json"
-        counter += 1
-    
-    # Write the job data to file
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(job_data, f, indent=2, ensure_ascii=False)
+    while True:
+        try:
+            fd = os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            break
+        except FileExistsError:
+            filepath = JOBS_DIR / f"{filename}_{counter}.json"
+            counter += 1
     
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+    except BaseException:
+        # Don't leave an empty file holding the name
+        filepath.unlink(missing_ok=True)
+        raise
     return filepath.stem
 
+
+class _JobEntry(NamedTuple):
+    mtime_ns: int
+    data: Dict[str, Any]
+    search_fields: Tuple[str, ...]
+    stem_lower: str
+    title_cf: str  # casefolded title
+    title_clean: str  # title_cf with punctuation replaced by spaces, stripped
+    title_tokens: frozenset
+    listing: str  # "- Title at Company (File: stem)" line used by the list/search tools
+
+
+# Parsed job files keyed by filename stem; an entry is reloaded when its mtime changes
+_job_index: Dict[str, _JobEntry] = {}
+_job_index_lock = threading.Lock()
+# Executor for reading job files concurrently during an index refresh. The API sets
+# this to its io_pool; without one (e.g. scripts) changed files are read one by one.
+io_executor: Optional[Executor] = None
+
+
+def _search_fields(job_data: Dict[str, Any], title_cf: str) -> Tuple[str, ...]:
+    """
+    Casefolded fields searched by search_jobs_by_criteria, most selective first.
+    
+    Short fields come first so a keyword found in the title or location never has to
+    scan the description or the requirement/responsibility lists.
+    """
+    return (
+        title_cf,
+        (job_data.get('location') or '').casefold(),
+        (job_data.get('description') or '').casefold(),
+        ' '.join(job_data.get('requirements') or []).casefold(),
+        ' '.join(job_data.get('responsibilities') or []).casefold(),
+    )
+
+
+def _load_json(path) -> Any:
+    """Parse a JSON file straight from its bytes."""
+    return orjson.loads(Path(path).read_bytes())
+
+
+@functools.lru_cache(maxsize=1024)
+def _load_json_cached(path: str, mtime_ns: int) -> Any:
+    """_load_json memoized per file version; callers must not mutate the result."""
+    return _load_json(path)
+
+
+def _try_load_json(path) -> Optional[Any]:
+    """Like _load_json, but returns None for unreadable or invalid files."""
+    try:
+        return _load_json(path)
+    except (orjson.JSONDecodeError, IOError):
+        return None
+
+
+def _keyword_matcher(keywords: List[str]) -> Callable[[str], bool]:
+    """Return a predicate that is true if a text contains any of the keywords."""
+    if ahocorasick is None or not keywords:
+        return lambda text: any(keyword in text for keyword in keywords)
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    # One pass over the text for all keywords, stopping at the first hit
+    return lambda text: next(automaton.iter(text), None) is not None
+
+
+def _list_job_files() -> List[os.DirEntry]:
+    """List the *.json entries in JOBS_DIR with a single directory read."""
+    with os.scandir(JOBS_DIR) as entries:
+        return [e for e in entries if e.name.endswith(".json") and e.is_file()]
+
+
+def _make_entry(stem: str, mtime_ns: int, job_data: Dict[str, Any]) -> _JobEntry:
+    """Parse-time projections of a job file, so queries don't recompute them."""
+    title_cf = (job_data.get('title') or '').casefold()
+    title_clean = _TITLE_PUNCT_RE.sub(' ', title_cf).strip()
+    return _JobEntry(
+        mtime_ns,
+        job_data,
+        _search_fields(job_data, title_cf),
+        stem.lower(),
+        title_cf,
+        title_clean,
+        frozenset(title_clean.split()),
+        f"- {job_data.get('title', 'Unknown')} at {job_data.get('company', 'Unknown')} (File: {stem})",
+    )
+
+
+def _scan_job_files() -> Tuple[set, List[Tuple[str, int, str]]]:
+    """
+    Stat every job file against the index.
+    
+    Returns the stems whose cached entry is current, and (stem, mtime_ns, path) for
+    files that are new or modified and need to be read.
+    """
+    fresh = set()
+    stale = []
+    for job_file in _list_job_files():
+        stem = job_file.name[:-5]
+        try:
+            mtime_ns = job_file.stat().st_mtime_ns
+        except IOError:
+            continue
+        cached = _job_index.get(stem)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            fresh.add(stem)
+        else:
+            stale.append((stem, mtime_ns, job_file.path))
+    return fresh, stale
+
+
+def _update_index(fresh: set, stale: List[Tuple[str, int, str]], loaded) -> List[Tuple[str, _JobEntry]]:
+    """Store freshly parsed job objects (anything else is skipped) and drop stems no longer on disk."""
+    seen = set(fresh)
+    for (stem, mtime_ns, _), job_data in zip(stale, loaded):
+        if not isinstance(job_data, dict):
+            continue
+        _job_index[stem] = _make_entry(stem, mtime_ns, job_data)
+        seen.add(stem)
+    for stem in _job_index.keys() - seen:
+        del _job_index[stem]
+    return list(_job_index.items())
+
+
+def _load_jobs() -> List[Tuple[str, _JobEntry]]:
+    """
+    Return (stem, entry) pairs for every readable job file.
+    
+    Only files that are new or modified since the previous call are parsed; files
+    that are deleted or no longer valid JSON are dropped from the index.
+    """
+    with _job_index_lock:
+        fresh, stale = _scan_job_files()
+        # Read changed files concurrently; a cold start can be the whole directory
+        paths = [path for _, _, path in stale]
+        pool = io_executor
+        loaded = pool.map(_try_load_json, paths) if pool is not None and len(paths) > 1 else map(_try_load_json, paths)
+        return _update_index(fresh, stale, loaded)
+
+
+async def _aread_json(path: str) -> Optional[Any]:
+    try:
+        async with aiofiles.open(path, 'rb') as f:
+            return orjson.loads(await f.read())
+    except (orjson.JSONDecodeError, IOError):
+        return None
+
+
+def _locked_update_index(fresh, stale, loaded) -> List[Tuple[str, _JobEntry]]:
+    with _job_index_lock:
+        return _update_index(fresh, stale, loaded)
+
+
+async def aload_all_jobs(executor: Optional[Executor] = None) -> List[Tuple[str, _JobEntry]]:
+    """
+    Async counterpart of _load_jobs for use from the event loop.
+    
+    Changed files are read concurrently with aiofiles; the directory scan and the
+    index update run on `executor` (the loop's default one if None) so the loop is
+    never blocked.
+    """
+    loop = asyncio.get_running_loop()
+    fresh, stale = await loop.run_in_executor(executor, _scan_job_files)
+    loaded = await asyncio.gather(*(_aread_json(path) for _, _, path in stale))
+    return await loop.run_in_executor(executor, _locked_update_index, fresh, stale, loaded)
+
 @tool
 def load_job_by_title(job_title: str) -> str:
     """Load a job description by job title from the jobs directory"""
-    job_files = list(JOBS_DIR.glob("*.json"))
-    
     # Normalize the search title (lowercase, replace spaces/hyphens with underscores)
     normalized_search = sanitize_filename(job_title.lower())
+    # Remove common punctuation for comparison
+    search_title_clean = _TITLE_PUNCT_RE.sub(' ', job_title.casefold())
+    search_title_stripped = search_title_clean.strip()
+    search_words = [word for word in search_title_clean.split() if len(word) > 3]
+    search_tokens = set(search_words)
     
-    for job_file in job_files:
-        try:
-            with open(job_file, 'r') as f:
-                job_data = json.load(f)
-            
-            # Check 1: Normalized filename match (matches how we generate filenames)
-            normalized_filename = job_file.stem.lower()
-            if normalized_search in normalized_filename or normalized_filename.startswith(normalized_search):
-                return format_job_data(job_data)
-            
-            # Check 2: Actual title field in JSON (flexible substring matching)
-            file_title = job_data.get('title', '').lower()
-            search_title_lower = job_title.lower()
-            
-            # Remove common punctuation for comparison
-            file_title_clean = re.sub(r'[^\w\s]', ' ', file_title)
-            search_title_clean = re.sub(r'[^\w\s]', ' ', search_title_lower)
-            
-            # Check if titles match (flexible: either contains the other)
-            if (search_title_clean.strip() in file_title_clean or 
-                file_title_clean.strip() in search_title_clean or
-                any(word in file_title_clean for word in search_title_clean.split() if len(word) > 3)):
-                return format_job_data(job_data)
-                
-        except (json.JSONDecodeError, IOError) as e:
+    entries = _load_jobs()
+    
+    # Check 1: Normalized filename match (matches how we generate filenames); needs
+    # no title cleaning, so it is tried against every file first
+    for _, entry in entries:
+        if normalized_search in entry.stem_lower:
+            return format_job_data(entry.data)
+    
+    # Check 2: Actual title field in JSON. A title containing (or contained in) the
+    # search wins outright; otherwise take the title sharing the most words with it,
+    # then any title that merely contains one of the search words.
+    best, best_score, partial = None, 0, None
+    for _, entry in entries:
+        file_title_clean = entry.title_clean
+        if not file_title_clean:
+            # An untitled job would "contain" every search; it can still match by filename
             continue
+        if search_title_stripped in file_title_clean or file_title_clean in search_title_clean:
+            return format_job_data(entry.data)
+        
+        score = len(search_tokens & entry.title_tokens)
+        if score > best_score:
+            best, best_score = entry, score
+        elif partial is None and any(word in file_title_clean for word in search_words):
+            partial = entry
+    
+    match = best or partial
+    if match is not None:
+        return format_job_data(match.data)
     
     return f"Job with title '{job_title}' not found in directory"
 
 
+_JOB_TEMPLATE = """Job: {title}
+Company: {company}
+Location: {location}
+Description: {description}
+Requirements: {requirements}
+Responsibilities: {responsibilities}
+Salary: {salary}
+Employment Type: {type}
+Experience Level: {experience_level}"""
+
+
 def format_job_data(job_data: Dict[str, Any]) -> str:
     """Format job data into a readable string."""
-    requirements = job_data.get('requirements', [])
-    responsibilities = job_data.get('responsibilities', [])
-    
-    return f"""Job: {job_data.get('title', 'Unknown')}
-Company: {job_data.get('company', 'Unknown')}
-Location: {job_data.get('location', 'Unknown')}
-Description: {job_data.get('description', '')}
-Requirements: {', '.join(requirements) if requirements else 'Not specified'}
-Responsibilities: {', '.join(responsibilities) if responsibilities else 'Not specified'}
-Salary: {job_data.get('salary', job_data.get('salary_range', 'Not specified'))}
-Employment Type: {job_data.get('type', job_data.get('employment_type', 'Not specified'))}
-Experience Level: {job_data.get('experience_level', 'Not specified')}"""
+    get = job_data.get
+    requirements = get('requirements', [])
+    responsibilities = get('responsibilities', [])
+    
+    return _JOB_TEMPLATE.format_map({
+        'title': get('title', 'Unknown'),
+        'company': get('company', 'Unknown'),
+        'location': get('location', 'Unknown'),
+        'description': get('description', ''),
+        'requirements': ', '.join(requirements) if requirements else 'Not specified',
+        'responsibilities': ', '.join(responsibilities) if responsibilities else 'Not specified',
+        # Older files use salary/type, parsed ones salary_range/employment_type
+        'salary': get('salary') or get('salary_range') or 'Not specified',
+        'type': get('type') or get('employment_type') or 'Not specified',
+        'experience_level': get('experience_level', 'Not specified'),
+    })
 
 @tool
 def search_jobs_by_title(job_title: str) -> str:
     """Search for jobs by partial title match"""
-    matching_jobs = []
-    job_files = list(JOBS_DIR.glob("*.json"))
+    # Check if job title contains the search term
+    needle = job_title.casefold()
+    matching_jobs = "\n".join(
+        entry.listing for _, entry in _load_jobs() if needle in entry.title_cf
+    )
     
-    for job_file in job_files:
-        with open(job_file, 'r') as f:
-            job_data = json.load(f)
-        
-        # Check if job title contains the search term
-        if job_title.lower() in job_data.get('title', '').lower():
-            matching_jobs.append(f"- {job_data.get('title', 'Unknown')} at {job_data.get('company', 'Unknown')} (File: {job_file.stem})")
-    
-    return f"Jobs matching '{job_title}':\n" + "\n".join(matching_jobs) if matching_jobs else f"No jobs found matching '{job_title}'"
+    return f"Jobs matching '{job_title}':\n" + matching_jobs if matching_jobs else f"No jobs found matching '{job_title}'"
 
 @tool
 def list_all_jobs() -> str:
     """List all available jobs with their titles and companies"""
-    job_files = list(JOBS_DIR.glob("*.json"))
-    if not job_files:
+    entries = _load_jobs()
+    if not entries:
         return "No jobs found in directory"
     
-    jobs = []
-    for job_file in job_files:
-        with open(job_file, 'r') as f:
-            job_data = json.load(f)
-        jobs.append(f"- {job_data.get('title', 'Unknown')} at {job_data.get('company', 'Unknown')} (File: {job_file.stem})")
-    
-    return "Available jobs:\n" + "\n".join(jobs)
+    return "Available jobs:\n" + "\n".join(entry.listing for _, entry in entries)
 
 @tool
 def get_job_by_filename(filename: str) -> str:
     """Get job details by exact filename (without .json extension)"""
     job_file = JOBS_DIR / f"{filename}.json"
-    if job_file.exists():
-        with open(job_file, 'r') as f:
-            job_data = json.load(f)
-        return f"""Job: {job_data.get('title', 'Unknown')}
-Company: {job_data.get('company', 'Unknown')}
-Location: {job_data.get('location', 'Unknown')}
-Description: {job_data.get('description', '')}
-Requirements: {', '.join(job_data.get('requirements', []))}
-Responsibilities: {', '.join(job_data.get('responsibilities', []))}
-Salary: {job_data.get('salary_range', 'Not specified')}
-Employment Type: {job_data.get('employment_type', 'Not specified')}
-Experience Level: {job_data.get('experience_level', 'Not specified')}"""
-    else:
+    try:
+        # One stat both checks existence and keys the parse cache
+        mtime_ns = job_file.stat().st_mtime_ns
+        job_data = _load_json_cached(str(job_file), mtime_ns)
+    except FileNotFoundError:
         return f"Job file '{filename}.json' not found"
+    except (orjson.JSONDecodeError, IOError):
+        # e.g. a file claimed by save_job_description whose write hasn't landed
+        return f"Job file '{filename}.json' could not be read"
+    return format_job_data(job_data)
 
 @tool
 def search_jobs_by_criteria(criteria: str) -> str:
     """Search jobs by specific criteria (skills, location, etc.)"""
-    matching_jobs = []
-    for job_file in JOBS_DIR.glob("*.json"):
-        with open(job_file, 'r') as f:
-            job_data = json.load(f)
-        
-        # Search in title, description, requirements, and responsibilities
-        searchable_text = f"{job_data.get('title', '')} {job_data.get('description', '')} {job_data.get('location', '')} {' '.join(job_data.get('requirements', []))} {' '.join(job_data.get('responsibilities', []))}".lower()
-        
-        if any(keyword.lower() in searchable_text for keyword in criteria.split()):
-            matching_jobs.append(f"- {job_data.get('title', 'Unknown')} at {job_data.get('company', 'Unknown')} (File: {job_file.stem})")
+    # Check each job's fields in _search_fields order, stopping at the first hit
+    matches = _keyword_matcher(criteria.casefold().split())
+    matching_jobs = "\n".join(
+        entry.listing
+        for _, entry in _load_jobs()
+        if any(matches(field) for field in entry.search_fields)
+    )
     
-    return f"Jobs matching '{criteria}':\n" + "\n".join(matching_jobs) if matching_jobs else f"No jobs found matching '{criteria}'"
\ No newline at end of file
+    return f"Jobs matching '{criteria}':\n" + matching_jobs if matching_jobs else f"No jobs found matching '{criteria}'"
\ No newline at end of file